@@ -1,3 +1,7 @@
+import bisect
+from pathlib import Path
+from typing import Callable, Optional
+
 from beancount import loader
 from beancount.core import data as d
 from beancount.parser.printer import EntryPrinter
@@ -6,6 +10,40 @@ from beancount.parser.parser import parse_string
 from beancount_mcp.text_editor import ChangeSet, ChangeType, TextEditor
 
 
+# Printer setup is not free, share one instance between editors
+_PRINTER = EntryPrinter()
+
+# Lineno index of each loaded ledger file, keyed by filename and validated
+# against its (mtime_ns, size) so an unchanged file is never parsed twice.
+_LOAD_CACHE: dict[str, tuple[int, int, list[tuple[str, int]]]] = {}
+
+
+def lineno_key(entry: d.Directive) -> tuple[str, int]:
+    """The (filename, lineno) position of an entry."""
+    return entry.meta.get("filename") or "", entry.meta.get("lineno") or 0
+
+
+def build_lineno_index(entries: list[d.Directive]) -> list[tuple[str, int]]:
+    """Sort the (filename, lineno) positions of entries.
+
+    The entry following a position can then be found with a single bisect.
+    """
+    return sorted(map(lineno_key, entries))
+
+
+def _load_lineno_index(file_name: str) -> list[tuple[str, int]]:
+    """Load a file and index its entries, reusing the previous result if it is unchanged."""
+    st = Path(file_name).stat()
+    cached = _LOAD_CACHE.get(file_name)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+
+    all_entries, _, _ = loader.load_file(file_name)
+    index = build_lineno_index(all_entries)
+    _LOAD_CACHE[file_name] = (st.st_mtime_ns, st.st_size, index)
+    return index
+
+
 class EntryEditor:
     """A class to edit entries in a Beancount file.
 
@@ -13,8 +51,16 @@ class EntryEditor:
     It also provides a method to save the changes made to the entries.
     """
 
-    def __init__(self):
-        self._entry_printer = EntryPrinter()
+    def __init__(self, lineno_index_provider: Optional[Callable[[], list[tuple[str, int]]]] = None):
+        """Initialize the editor.
+
+        Args:
+            lineno_index_provider: Returns the `build_lineno_index` of the already loaded ledger.
+                Used to find entry boundaries without parsing the file again; if not given,
+                the file is loaded.
+        """
+        self._entry_printer = _PRINTER
+        self._lineno_index_provider = lineno_index_provider
 
     def replace_entry(self, old_entry: d.Directive, new_entry: d.Directive):
         """Replace an entry with a new one."""
@@ -53,11 +99,12 @@ class EntryEditor:
     def _infer_lineno_range(self, entry: d.Directive) -> tuple[int, int]:
         file_name = entry.meta["filename"]
         start_lineno = entry.meta["lineno"]
-        all_entries, _, _ = loader.load_file(file_name)
-        end_lineno = 0
-        for e in all_entries:
-            lineno = e.meta.get("lineno", 0)
-            if lineno > start_lineno and (lineno < end_lineno or end_lineno == 0):
-                end_lineno = lineno
+        if self._lineno_index_provider is not None:
+            index = self._lineno_index_provider()
+        else:
+            index = _load_lineno_index(file_name)
+        # Only entries from the same file can bound this one
+        i = bisect.bisect_right(index, (file_name, start_lineno))
+        end_lineno = index[i][1] if i < len(index) and index[i][0] == file_name else 0
 
         return start_lineno - 1, end_lineno - 1
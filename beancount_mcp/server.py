@@ -1,40 +1,146 @@
 """Beancount MCP Server implementation."""
 
+import asyncio
 import re
+import bisect
+import hashlib
+import itertools
 import json
 import logging
+import os
 import time
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 import signal
+import threading
 from typing import Dict, List, Any, Optional
 
 from beancount import loader
+import beanquery
 from beanquery.query import run_query
 from beancount.core import data, getters
 from beancount.core.compare import hash_entry
+from beancount.ops import validation
+from beancount.parser import booking
+from beancount.parser.parser import parse_file, parse_string
 from beancount.parser.printer import EntryPrinter
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-from beancount_mcp.entry_editor import EntryEditor
+from watchdog.observers.polling import PollingObserver
+from watchdog.events import PatternMatchingEventHandler
+from beancount_mcp.entry_editor import EntryEditor, build_lineno_index, lineno_key
 from mcp.server.fastmcp import FastMCP
 
 
 logger = logging.getLogger(__name__)
 
+# In case LLM wrote date with quote like `WHERE date > '2025-04-01'`
+_DATE_QUOTE_RE = re.compile(r'[\'"](\d{4}-\d{2}-\d{2})[\'"]')
+# In case LLM wrote query like SQL: `SELECT sum(position) FROM transactions`
+_FROM_TX_RE = re.compile(r"FROM transactions?", re.IGNORECASE)
+# Statements understood by BQL
+_LOOKS_LIKE_BQL_RE = re.compile(r"^\s*(SELECT|BALANCES|JOURNAL|PRINT)\b", re.IGNORECASE)
+# Leave SELECT queries that already limit or pivot their rows alone
+_SELECT_RE = re.compile(r"^\s*SELECT\b", re.IGNORECASE)
+_LIMIT_OR_PIVOT_RE = re.compile(r"\b(LIMIT|PIVOT\s+BY)\b", re.IGNORECASE)
+# A line setting an option for the whole ledger
+_OPTION_LINE_RE = re.compile(rb"^(option|plugin|include)\b", re.MULTILINE)
+# Options that differ between any two parses, even of files setting no options
+_PER_PARSE_OPTIONS = frozenset({"filename", "dcontext"})
+# Maximum number of rows returned by a BQL query
+_MAX_ROWS = 200
+# Maximum number of BQL results kept per ledger state
+_QUERY_CACHE_SIZE = 128
+
+
+def _count_lines(fd: int) -> int:
+    """Count the newlines in a file from the start, reading through an open descriptor."""
+    os.lseek(fd, 0, os.SEEK_SET)
+    count = 0
+    while chunk := os.read(fd, 1 << 16):
+        count += chunk.count(b"\n")
+    return count
+
+
+def _depends_on_ledger(entry: data.Directive) -> bool:
+    """Whether booking, plugins or validation make this entry depend on more than its own file."""
+    # Document paths are checked against the file system by the documents plugin
+    if isinstance(entry, (data.Pad, data.Balance, data.Document)):
+        return True
+    return isinstance(entry, data.Transaction) and any(
+        posting.cost is not None for posting in entry.postings
+    )
+
+
+def _sets_options(options_map: Dict[str, Any]) -> bool:
+    """Whether a parsed file sets any option, include or plugin of its own."""
+    defaults = parse_string("")[2]
+    return any(
+        options_map[key] != value for key, value in defaults.items() if key not in _PER_PARSE_OPTIONS
+    )
+
+
+def _files_setting_options(paths: List[str]) -> set[str]:
+    """The files among paths with an option, plugin or include line."""
+    option_files = set()
+    for path in paths:
+        try:
+            content = Path(path).read_bytes()
+        except OSError:
+            continue
+        if _OPTION_LINE_RE.search(content):
+            option_files.add(path)
+    return option_files
+
 
-class BeancountFileHandler(FileSystemEventHandler):
-    """File system event handler for Beancount files."""
+def _file_digest(path: str) -> Optional[bytes]:
+    """Hash the content of a file, or return None if it cannot be read."""
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with Path(path).open("rb") as f:
+            while chunk := f.read(1 << 17):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.digest()
+
+
+class BeancountFileHandler(PatternMatchingEventHandler):
+    """File system event handler for Beancount files.
+
+    Reloads are debounced: every event restarts a short timer, so a burst of
+    writes (an editor save, a `git pull`) triggers a single reload once the
+    files have settled. A burst that never settles is still reloaded after
+    `max_wait` seconds. Files whose content hash did not change (a `touch`,
+    an editor saving unmodified content) are not reloaded at all.
+    """
 
-    def __init__(self, server: "BeancountMCPServer"):
+    def __init__(self, server: "BeancountMCPServer", delay: float = 0.3, max_wait: float = 5.0):
         """Initialize the handler with a reference to the server.
 
         Args:
             server: The BeancountFileHandler instance.
+            delay: Seconds to wait after the last event before reloading.
+            max_wait: Maximum seconds to postpone a reload during a burst of events.
         """
+        super().__init__(
+            patterns=["*.bean"],
+            ignore_patterns=["*/.git/*"],
+            ignore_directories=True,
+        )
         self.server = server
-        self.last_modified = time.time()
-        self.cooldown = 2
+        self.delay = delay
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._first_event_time: Optional[float] = None
+        self._pending: set[str] = set()
+        self._reloading = False
+        self._file_hashes: Dict[str, bytes] = {}
+        for path in server.options_map["include"]:
+            digest = _file_digest(path)
+            if digest is not None:
+                self._file_hashes[path] = digest
 
     def on_modified(self, event):
         """Handle file modification events.
@@ -42,22 +148,104 @@ class BeancountFileHandler(FileSystemEventHandler):
         Args:
             event: The file system event.
         """
-        if event.is_directory:
-            return
+        self._schedule_reload(str(event.src_path))
 
-        if not str(event.src_path).endswith(".bean"):
-            return
+    def on_created(self, event):
+        """Handle file creation events.
+
+        Args:
+            event: The file system event.
+        """
+        self.server.invalidate_resources()
 
-        current_time = time.time()
-        if current_time - self.last_modified < self.cooldown:
+    def on_deleted(self, event):
+        """Handle file deletion events.
+
+        Args:
+            event: The file system event.
+        """
+        self.server.invalidate_resources()
+
+    def on_moved(self, event):
+        """Handle file move events.
+
+        Args:
+            event: The file system event.
+        """
+        self.server.invalidate_resources()
+        # Editors saving atomically rename a temporary file over the ledger file
+        if str(event.dest_path).endswith(".bean"):
+            self._schedule_reload(str(event.dest_path))
+
+    def _schedule_reload(self, path: str):
+        with self._lock:
+            if self._first_event_time is None:
+                self._first_event_time = time.monotonic()
+            self._pending.add(path)
+            # Events arriving during a reload are picked up once it finishes
+            if not self._reloading:
+                self._start_timer()
+
+    def _start_timer(self):
+        # Must be called with self._lock held
+        if self._timer is not None:
+            self._timer.cancel()
+
+        remaining = self._first_event_time + self.max_wait - time.monotonic()
+        self._timer = threading.Timer(max(0.0, min(self.delay, remaining)), self._reload)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _reload(self):
+        with self._lock:
+            # A timer cancelled too late to stop it from firing is stale
+            if self._timer is not threading.current_thread():
+                return
+            paths = sorted(self._pending)
+            self._pending.clear()
+            self._timer = None
+            self._first_event_time = None
+            self._reloading = True
+
+        try:
+            self._reload_changed(paths)
+        finally:
+            with self._lock:
+                self._reloading = False
+                if self._pending:
+                    self._start_timer()
+
+    def _reload_changed(self, paths: List[str]):
+        digests = {path: _file_digest(path) for path in paths}
+        paths = [
+            path for path in paths
+            if digests[path] is None or digests[path] != self._file_hashes.get(path)
+        ]
+        if not paths:
             return
 
-        self.last_modified = current_time
-        logger.info("Detected changes in %s, reloading...", event.src_path)
+        logger.info("Detected changes in %s, reloading...", ", ".join(paths))
         try:
-            self.server.load_beancount_file()
+            self.server.reload_files(paths)
         except Exception as e:
             logger.error("Error reloading Beancount file: %s", e)
+            return
+
+        # Only remember the new content once it has been loaded
+        for path in paths:
+            if digests[path] is None:
+                self._file_hashes.pop(path, None)
+            else:
+                self._file_hashes[path] = digests[path]
+
+    def cancel(self):
+        """Cancel a pending reload."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._first_event_time = None
+            self._pending.clear()
 
 
 class BeancountMCPServer:
@@ -71,29 +259,172 @@ class BeancountMCPServer:
         """
         self.entry_path = beancount_file
         self.beancount_file = Path(beancount_file).resolve()
+        self._bean_files: Optional[List[str]] = None
+        self._append_fds: Dict[str, int] = {}
+        # Line count of each appended file, keyed by path and validated against (mtime_ns, size)
+        self._line_counts: Dict[str, tuple[int, int, int]] = {}
+        self._hash_memo: Dict[int, tuple[data.Transaction, str]] = {}
+        self._query_cache_lock = threading.Lock()
+        # Serializes reloads and in-place merges of the loaded ledger state
+        self._state_lock = threading.RLock()
         self.load_beancount_file()
-        self.entry_editor = EntryEditor()
+        self.entry_editor = EntryEditor(lambda: self._lineno_index)
         self.setup_file_watcher()
         self.printer = EntryPrinter(dcontext=self.options_map.get("dcontext"))
 
     def load_beancount_file(self):
         """Load the Beancount file and extract necessary data."""
         try:
-            self.entries, self.errors, self.options_map = loader.load_file(self.beancount_file)
-            self.accounts = getters.get_accounts(self.entries)
-            self.last_load_time = time.time()
+            with self._state_lock:
+                self.entries, self.errors, self.options_map = loader.load_file(self.beancount_file)
+                self._option_files = _files_setting_options(self.options_map["include"][1:])
+                self._update_indexes()
             if self.errors:
                 logger.error("Found %d errors in the Beancount file", len(self.errors))
-        except Exception as e:
-            logger.error("Error loading Beancount file: %s", e)
+        except Exception:
+            logger.exception("Error loading Beancount file")
             raise
 
+    def reload_files(self, paths: List[str]):
+        """Reload the ledger after the given files changed.
+
+        Only the changed files are parsed again when possible, otherwise the
+        whole ledger is loaded.
+
+        Args:
+            paths: Absolute paths of the changed files.
+        """
+        if not self._reload_partially(set(paths)):
+            self.load_beancount_file()
+
+    def _reload_partially(self, paths: set[str]) -> bool:
+        """Parse and book only the changed files, and splice their entries in.
+
+        This is only correct when the entries of a file do not depend on the
+        rest of the ledger, so the full reload is still required if the root
+        file changed or `_can_merge` rejects the old and new entries.
+
+        Args:
+            paths: Absolute paths of the changed files.
+
+        Returns:
+            False if a full reload is required.
+        """
+        with self._state_lock:
+            if str(self.beancount_file) in paths or not paths <= set(self.options_map["include"]):
+                return False
+            # Removing an option from a file also changes the ledger's options
+            if not paths.isdisjoint(self._option_files):
+                return False
+
+            old_entries = [e for e in self.entries if e.meta.get("filename") in paths]
+            new_entries = []
+            for path in paths:
+                try:
+                    file_entries, errors, file_options = parse_file(path)
+                except OSError:
+                    return False
+                if errors or _sets_options(file_options):
+                    return False
+                new_entries.extend(file_entries)
+            if not self._can_merge(old_entries, new_entries):
+                return False
+
+            new_entries, errors = booking.book(new_entries, self.options_map)
+            if errors:
+                return False
+
+            entries = [e for e in self.entries if e.meta.get("filename") not in paths]
+            entries.extend(new_entries)
+            entries.sort(key=data.entry_sortkey)
+            self.errors = self._merge_errors(entries, paths)
+            self.entries = entries
+            self._update_indexes()
+            logger.info("Reloaded %d changed file(s) without a full reload", len(paths))
+            return True
+
+    def _can_merge(self, old_entries: List[data.Directive], new_entries: List[data.Directive]) -> bool:
+        """Whether entries can be swapped into the loaded ledger without a full reload.
+
+        Plugins, document directories, padding, balance assertions, document
+        entries and lots held at cost make entries depend on the rest of the
+        ledger, and are only handled correctly by a full reload. That covers a Pad or Balance
+        anywhere in the ledger on an account the swapped entries touch.
+
+        Args:
+            old_entries: The loaded entries being removed.
+            new_entries: The parsed entries being added.
+        """
+        if self.options_map["plugin"] or self.options_map["documents"]:
+            return False
+        changed = list(itertools.chain(old_entries, new_entries))
+        if any(_depends_on_ledger(e) for e in changed):
+            return False
+        return self._checked_accounts.isdisjoint(getters.get_accounts(changed))
+
+    def _merge_errors(self, entries: List[data.Directive], paths: set[str]) -> List[Any]:
+        """Errors of merged entries: load errors of unchanged files plus a fresh validation.
+
+        Args:
+            entries: The merged entries.
+            paths: Files whose entries were replaced.
+        """
+        errors = [
+            e for e in self.errors
+            if not isinstance(e, validation.ValidationError)
+            and (getattr(e, "source", None) or {}).get("filename") not in paths
+        ]
+        errors.extend(validation.validate(entries, self.options_map))
+        return errors
+
+    def _update_indexes(self):
+        """Rebuild the lookup structures derived from the loaded entries."""
+        # Accounts whose balances padding and balance assertions depend on
+        self._checked_accounts = set()
+        for entry in self.entries:
+            if isinstance(entry, data.Pad):
+                self._checked_accounts.update((entry.account, entry.source_account))
+            elif isinstance(entry, data.Balance):
+                self._checked_accounts.add(entry.account)
+        self.accounts = getters.get_accounts(self.entries)
+        self._accounts_json = json.dumps(sorted(self.accounts), ensure_ascii=False)
+        self._index_transactions()
+        self._lineno_index = build_lineno_index(self.entries)
+        self.last_load_time = time.time()
+        self._query_cache = OrderedDict()
+
+    def _index_transactions(self):
+        """Build the hash -> transaction index of the loaded entries.
+
+        Hashes are memoized by entry identity, the memo keeps a reference to
+        each entry so its id cannot be reused. Entry objects that survive a
+        reload are not hashed again; the memo is then trimmed to the entries
+        still loaded.
+        """
+        memo = {}
+        for entry in self.entries:
+            if isinstance(entry, data.Transaction):
+                cached = self._hash_memo.get(id(entry))
+                memo[id(entry)] = cached or (entry, hash_entry(entry))
+        self._hash_memo = memo
+        self._tx_by_hash = {tx_hash: entry for entry, tx_hash in memo.values()}
+        self._tx_hash_sorted = sorted(self._tx_by_hash)
+
     def setup_file_watcher(self):
-        """Setup a file watcher to monitor changes to the Beancount file."""
-        self.observer = Observer()
-        event_handler = BeancountFileHandler(self)
+        """Setup a file watcher to monitor changes to the Beancount file.
+
+        Native file system events are used by default. Set
+        `BEANCOUNT_MCP_WATCH_INTERVAL` to a number of seconds to poll instead,
+        for ledgers on NFS or Docker volumes where native events are unreliable.
+        """
+        watch_interval = os.environ.get("BEANCOUNT_MCP_WATCH_INTERVAL")
+        if watch_interval:
+            self.observer = PollingObserver(timeout=float(watch_interval))
+        else:
+            self.observer = Observer()
+        self.event_handler = BeancountFileHandler(self)
         self.observer.schedule(
-            event_handler, str(self.beancount_file.parent), recursive=True
+            self.event_handler, str(self.beancount_file.parent), recursive=True
         )
         self.observer.start()
         logger.info("Started file watcher for %s", self.beancount_file.parent)
@@ -102,6 +433,15 @@ class BeancountMCPServer:
         logger.info("Shutting down file watcher")
         self.observer.stop()
         self.observer.join()
+        self.event_handler.cancel()
+        for fd in self._append_fds.values():
+            os.close(fd)
+        self._append_fds.clear()
+
+    @property
+    def accounts_json(self) -> str:
+        """All accounts of the ledger as a sorted JSON list, serialized once per load."""
+        return self._accounts_json
 
     @property
     def resources(self) -> List[str]:
@@ -110,14 +450,21 @@ class BeancountMCPServer:
         Returns:
             Available resources.
         """
-        # List all files in the Beancount directory
-        ledger_dir = self.beancount_file.parent
-        ledger_files = []
-        for path in ledger_dir.glob("**/*.bean"):
-            if path.is_file():
-                ledger_files.append(str(path.relative_to(ledger_dir)))
+        # List all files in the Beancount directory, the watcher drops
+        # the snapshot whenever a .bean file is created, deleted or moved
+        if self._bean_files is None:
+            ledger_dir = self.beancount_file.parent
+            self._bean_files = [
+                str(path.relative_to(ledger_dir))
+                for path in ledger_dir.glob("**/*.bean")
+                if path.is_file()
+            ]
+
+        return self._bean_files
 
-        return ledger_files
+    def invalidate_resources(self):
+        """Drop the cached list of ledger files."""
+        self._bean_files = None
 
     def query_bql(self, query_string: str) -> Dict[str, List[Any]]:
         """Execute a BQL query.
@@ -132,30 +479,72 @@ class BeancountMCPServer:
         """
         if not query_string:
             raise ValueError("Query parameter is required")
+        # Reject anything that is not a BQL statement before doing any work on it
+        if not _LOOKS_LIKE_BQL_RE.match(query_string):
+            raise ValueError(
+                "BQL query error: query must start with SELECT, BALANCES, JOURNAL or PRINT"
+            )
 
         # Some tricky stuff to make BQL query work
-        # In case LLM wrote date with quote like `WHERE date > '2025-04-01'`
-        pattern = re.compile(r'[\'"](\d{4}-\d{2}-\d{2})[\'"]')
-        query_string = re.sub(pattern, r"\1", query_string)
-        # In case LLM wrote query like SQL: `SELECT sum(position) FROM transactions`
-        from_pattern = re.compile(r"FROM transactions?")
-        query_string = re.sub(from_pattern, "", query_string)
+        query_string = _DATE_QUOTE_RE.sub(r"\1", query_string)
+        if "FROM" in query_string.upper():
+            query_string = _FROM_TX_RE.sub("", query_string)
+        # Let the query engine stop early instead of producing rows we would drop
+        if _SELECT_RE.match(query_string) and not _LIMIT_OR_PIVOT_RE.search(query_string):
+            query_string = f"{query_string.rstrip().rstrip(';')} LIMIT {_MAX_ROWS}"
+
+        # Identical queries against the same ledger state are served from cache
+        cache_key = (query_string, self.last_load_time)
+        query_cache = self._query_cache
+        with self._query_cache_lock:
+            result = query_cache.get(cache_key)
+            if result is not None:
+                query_cache.move_to_end(cache_key)
+                return result
+
         try:
             types, rows = run_query(self.entries, self.options_map, query_string)
-            column_names = [
-                {
-                    "name": t.name,
-                    "type": f"{t.datatype.__module__}.{t.datatype.__qualname__}",
-                }
-                for t in (types or [])
-            ]
+        except beanquery.Error as e:
+            raise ValueError(f"BQL query error: {e}") from e
 
-            return {
-                "columns": column_names,
-                "rows": [[str(c) for c in r] for r in rows[:200]],
+        column_names = [
+            {
+                "name": t.name,
+                "type": f"{t.datatype.__module__}.{t.datatype.__qualname__}",
             }
-        except Exception as e:
-            raise ValueError("BQL query error: %s", e) from e
+            for t in (types or [])
+        ]
+        result = {
+            "columns": column_names,
+            "rows": [[str(c) for c in r] for r in itertools.islice(rows, _MAX_ROWS)],
+        }
+
+        with self._query_cache_lock:
+            query_cache[cache_key] = result
+            if len(query_cache) > _QUERY_CACHE_SIZE:
+                query_cache.popitem(last=False)
+        return result
+
+    def _find_transaction(self, tx_id: str) -> data.Transaction:
+        """Look up a transaction by its ID in the hash index.
+
+        A truncated ID is accepted as long as it is the prefix of exactly one
+        transaction ID.
+        """
+        entry = self._tx_by_hash.get(tx_id)
+        if entry is not None:
+            return entry
+
+        # IDs sharing the prefix are adjacent in the sorted list
+        hashes = self._tx_hash_sorted
+        i = bisect.bisect_left(hashes, tx_id)
+        if i < len(hashes) and hashes[i].startswith(tx_id):
+            if i + 1 < len(hashes) and hashes[i + 1].startswith(tx_id):
+                raise ValueError(f"Transaction ID {tx_id} is ambiguous, please use the full ID")
+            entry = self._tx_by_hash.get(hashes[i])
+        if entry is None:
+            raise ValueError(f"Transaction with ID {tx_id} not found")
+        return entry
 
     def get_transaction(self, tx_id: str) -> Dict[str, Any]:
         """Get transaction details by ID.
@@ -169,17 +558,14 @@ class BeancountMCPServer:
         if not tx_id:
             raise ValueError("Transaction ID is required")
 
-        for entry in self.entries:
-            if isinstance(entry, data.Transaction) and hash_entry(entry) == tx_id:
-                filename = entry.meta.get("filename")
-                lineno = entry.meta.get("lineno")
-
-                return {
-                    "transaction": self.printer(entry),
-                    "location": {"filename": filename, "lineno": lineno},
-                }
+        entry = self._find_transaction(tx_id)
+        filename = entry.meta.get("filename")
+        lineno = entry.meta.get("lineno")
 
-        raise ValueError(f"Transaction with ID {tx_id} not found")
+        return {
+            "transaction": self.printer(entry),
+            "location": {"filename": filename, "lineno": lineno},
+        }
 
     def submit_transaction(
         self, transaction: str, file_path: Optional[str] = None
@@ -197,18 +583,109 @@ class BeancountMCPServer:
 
         # Use entrypoint file path if not provided
         if not file_path:
-            file_path = self.beancount_file
+            path = self.beancount_file
         else:
             ledger_dir = self.beancount_file.parent
-            file_path = ledger_dir / file_path
+            path = ledger_dir / file_path
 
-        if not Path.exists(file_path):
-            raise ValueError(f"File {file_path} does not exist")
+        if not path.is_file():
+            raise ValueError(f"File {path} does not exist")
 
-        with Path.open(file_path, "a") as f:
-            f.write(transaction)
+        # A reload between the write and the merge would merge the text twice
+        with self._state_lock:
+            firstline = self._append_to_file(path, transaction)
+            merged = self._append_entries(transaction, str(path), firstline)
+        if not merged:
+            self.load_beancount_file()
 
-        self.load_beancount_file()
+    def _append_to_file(self, file_path: Path, text: str) -> int:
+        """Append text to a ledger file through a descriptor kept open across calls.
+
+        Args:
+            file_path: The ledger file to append to.
+            text: The text to append.
+
+        Returns:
+            The line number in the file where the appended text starts.
+        """
+        key = str(file_path)
+        fd = self._append_fds.get(key)
+        if fd is not None:
+            st, current = os.fstat(fd), file_path.stat()
+            if (st.st_dev, st.st_ino) != (current.st_dev, current.st_ino):
+                # The file was replaced (e.g. by an editor's atomic save), reopen it
+                os.close(fd)
+                fd = None
+        if fd is None:
+            fd = os.open(key, os.O_RDWR | os.O_APPEND | getattr(os, "O_BINARY", 0))
+            self._append_fds[key] = fd
+
+        st = os.fstat(fd)
+        cached = self._line_counts.get(key)
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+            n_lines = cached[2]
+        else:
+            n_lines = _count_lines(fd)
+
+        content = text.encode("utf-8")
+        os.write(fd, content)
+        st = os.fstat(fd)
+        self._line_counts[key] = (st.st_mtime_ns, st.st_size, n_lines + content.count(b"\n"))
+        return n_lines + 1
+
+    def _append_entries(self, text: str, filename: str, firstline: int) -> bool:
+        """Merge text just appended to a ledger file into the loaded entries.
+
+        Only the new text is parsed, booked and validated with the ledger,
+        instead of reloading the whole ledger, as long as `_can_merge` accepts
+        the new entries. The file watcher still picks up the change and
+        reloads the file afterwards.
+
+        Args:
+            text: The appended text in beancount syntax.
+            filename: The ledger file the text was appended to.
+            firstline: The line number in the file where the text starts.
+
+        Returns:
+            False if the text cannot be merged and a full reload is required.
+        """
+        with self._state_lock:
+            if filename not in self.options_map["include"]:
+                return False
+
+            new_entries, errors, text_options = parse_string(
+                text, report_filename=filename, report_firstline=firstline
+            )
+            if errors or _sets_options(text_options) or not self._can_merge([], new_entries):
+                return False
+            new_entries, errors = booking.book(new_entries, self.options_map)
+            if errors:
+                return False
+
+            # Queries may be running in other threads, so update copies and swap them in
+            entries = list(self.entries)
+            lineno_index = list(self._lineno_index)
+            tx_hash_sorted = list(self._tx_hash_sorted)
+            for entry in new_entries:
+                bisect.insort(entries, entry, key=data.entry_sortkey)
+                bisect.insort(lineno_index, lineno_key(entry))
+                if isinstance(entry, data.Transaction):
+                    tx_hash = hash_entry(entry)
+                    self._hash_memo[id(entry)] = (entry, tx_hash)
+                    self._tx_by_hash[tx_hash] = entry
+                    bisect.insort(tx_hash_sorted, tx_hash)
+            self.errors = self._merge_errors(entries, set())
+            self.entries = entries
+            self._lineno_index = lineno_index
+            self._tx_hash_sorted = tx_hash_sorted
+            # Only the new entries can add accounts, and most submissions add none
+            new_accounts = getters.get_accounts(new_entries) - self.accounts
+            if new_accounts:
+                self.accounts = self.accounts | new_accounts
+                self._accounts_json = json.dumps(sorted(self.accounts), ensure_ascii=False)
+            self.last_load_time = time.time()
+            self._query_cache = OrderedDict()
+            return True
 
     def replace_transaction(self, tx_id: str, transaction: str) -> None:
         """Replace an existing transaction.
@@ -222,14 +699,7 @@ class BeancountMCPServer:
         if not tx_id:
             raise ValueError("Transaction ID is required")
 
-        for entry in self.entries:
-            if isinstance(entry, data.Transaction) and hash_entry(entry) == tx_id:
-                # Update the transaction with new data
-                old_transaction = entry
-                break
-        else:
-            raise ValueError(f"Transaction with ID {tx_id} not found")
-
+        old_transaction = self._find_transaction(tx_id)
         self.entry_editor.replace_entry_with_string(old_transaction, transaction)
 
 
@@ -250,6 +720,9 @@ signal.signal(signal.SIGINT, signal_handler)
 
 
 mcp = FastMCP("beancount")
+# Tools run in worker threads so queries do not block the event loop.
+# Reads may overlap, while writes to the ledger are serialized.
+write_lock = asyncio.Lock()
 
 
 @mcp.tool()
@@ -265,7 +738,11 @@ async def beancount_query(query: str) -> str:
         return json.dumps({"error": "Beancount manager is not initialized"})
 
     logger.info("Received BQL query: %s", query)
-    return json.dumps(manager.query_bql(query), ensure_ascii=False)
+    try:
+        result = await asyncio.to_thread(manager.query_bql, query)
+        return json.dumps(result, ensure_ascii=False)
+    except ValueError as e:
+        return json.dumps({"error": str(e)})
 
 
 @mcp.tool()
@@ -280,7 +757,8 @@ async def beancount_get_transaction(tx_id: str) -> str:
         return json.dumps({"error": "Beancount manager is not initialized"})
 
     try:
-        return json.dumps(manager.get_transaction(tx_id), ensure_ascii=False)
+        result = await asyncio.to_thread(manager.get_transaction, tx_id)
+        return json.dumps(result, ensure_ascii=False)
     except ValueError as e:
         return json.dumps({"error": str(e)})
 
@@ -298,7 +776,7 @@ async def beancount_accounts() -> str:
         return json.dumps({"error": "Beancount manager is not initialized"})
 
     try:
-        return json.dumps(list(manager.accounts), ensure_ascii=False)
+        return manager.accounts_json
     except ValueError as e:
         return json.dumps({"error": str(e)})
 
@@ -327,7 +805,8 @@ async def beancount_submit_transaction(transaction: str) -> str:
         return json.dumps({"error": "Beancount manager is not initialized"})
 
     try:
-        manager.submit_transaction("\n" + transaction + "\n")
+        async with write_lock:
+            await asyncio.to_thread(manager.submit_transaction, "\n" + transaction + "\n")
         return json.dumps({"result": "success"}, ensure_ascii=False)
     except ValueError as e:
         return json.dumps({"error": str(e)})
@@ -358,10 +837,12 @@ async def beancount_replace_transaction(tx_id: str, transaction: str) -> str:
         Replace result
     """
     try:
-        manager.replace_transaction(
-            tx_id,
-            transaction,
-        )
+        async with write_lock:
+            await asyncio.to_thread(
+                manager.replace_transaction,
+                tx_id,
+                transaction,
+            )
     except AssertionError as e:
         return json.dumps({"error": str(e)})
 
@@ -392,7 +873,7 @@ async def accounts() -> str:
     if manager is None:
         return json.dumps({"error": "Beancount manager is not initialized"})
 
-    return json.dumps(list(manager.accounts), ensure_ascii=False)
+    return manager.accounts_json
 
 
 @mcp.resource(